@@ -1,7 +1,5 @@
 from flask import Flask, request, render_template, jsonify, url_for, send_from_directory
 import yt_dlp
-from pydub import AudioSegment
-from pydub.effects import low_pass_filter, normalize
 import uuid
 import os
 import re
@@ -10,50 +8,84 @@ import numpy as np
 from scipy import signal
 import subprocess
 import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
 # Create processed directory if it doesn't exist
 os.makedirs('static/processed', exist_ok=True)
 
+# Downloads are network-bound and DSP/encoding is CPU-bound, so they run on
+# separate pools and one request's download can overlap another's encode.
+# The DSP runs in numpy/scipy (which release the GIL) and FFmpeg, so threads
+# are enough and presets can share one decoded buffer
+download_pool = ThreadPoolExecutor(max_workers=4)
+dsp_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# The presets a user didn't ask for are rendered ahead of time, one at a time
+# across all requests, so a long video doesn't hold several renders in memory at once
+prerender_pool = ThreadPoolExecutor(max_workers=1)
+
+# Raw downloads are cached per video ID so preset changes don't re-fetch from YouTube.
+# Kept outside static/ so the downloads themselves are never served
+CACHE_DIR = 'cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used downloads are evicted past 2 GB
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# Processed MP3s keyed by (video_id, preset), least recently used first
+PROCESSED_CACHE_SIZE = 256
+processed_cache = OrderedDict()
+processed_cache_lock = threading.Lock()
+
+# Renders in progress keyed by (video_id, preset), so concurrent requests share one
+rendering = {}
+rendering_lock = threading.Lock()
+
+# Decoded float32 samples keyed by video_id, least recently used first
+DECODED_CACHE_MAX_BYTES = 1024 ** 3  # ~10 five-minute stereo tracks (~106 MB each)
+decoded_cache = OrderedDict()
+decoded_cache_lock = threading.Lock()
+
+# Working sample rate for decoded audio
+SAMPLE_RATE = 44100
+
 # Ambience presets configuration
 PRESETS = {
     'small_room': {
         'name': 'Small Room',
         'low_pass_cutoff': 3000,
+        'low_pass_order': 4,
         'reverb_decay': 1.5,
-        'gain_reduction': -12,
-        'stereo_width': 1.8,
-        'distance_factor': 0.4
+        'stereo_width': 1.8
     },
     'concert_hall': {
         'name': 'Concert Hall',
         'low_pass_cutoff': 2000,
+        'low_pass_order': 4,
         'reverb_decay': 4.0,
-        'gain_reduction': -18,
-        'stereo_width': 2.2,
-        'distance_factor': 0.2
+        'stereo_width': 2.2
     },
     'next_room': {
         'name': 'Next Room',
-        'low_pass_cutoff': 1500,
+        'low_pass_cutoff': 800,
+        'low_pass_order': 6,  # Steeper roll-off for the muffled, through-a-wall sound
         'reverb_decay': 2.8,
-        'gain_reduction': -20,
-        'stereo_width': 1.6,
-        'extra_muffling': True,
-        'distance_factor': 0.15
+        'stereo_width': 1.6
     }
 }
 
+# YouTube URL formats, compiled once at import
+VIDEO_ID_PATTERNS = [
+    re.compile(r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)'),
+    re.compile(r'youtube\.com\/watch\?.*v=([^&\n?#]+)')
+]
+
 def extract_video_id(url):
     """Extract YouTube video ID from various URL formats"""
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)',
-        r'youtube\.com\/watch\?.*v=([^&\n?#]+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in VIDEO_ID_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     
@@ -63,39 +95,81 @@ def check_ffmpeg():
     """Check if FFmpeg is available"""
     return shutil.which('ffmpeg') is not None
 
+def find_cached_audio(video_id):
+    """Return the cached download for a video ID, if there is one"""
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_file() and os.path.splitext(entry.name)[0] == video_id:
+            # Touch the file so eviction treats it as recently used
+            try:
+                os.utime(entry.path)
+            except FileNotFoundError:
+                # Evicted by another request since the scan - treat as a cache miss
+                return None
+            return entry.path
+    
+    return None
+
+def evict_audio_cache():
+    """Delete least recently used downloads until the cache fits in CACHE_MAX_BYTES"""
+    entries = [entry for entry in os.scandir(CACHE_DIR) if entry.is_file()]
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    total_size = sum(entry.stat().st_size for entry in entries)
+    
+    # Never evict the most recent entry, it is about to be processed
+    for entry in entries[:-1]:
+        if total_size <= CACHE_MAX_BYTES:
+            break
+        entry_size = entry.stat().st_size
+        try:
+            os.remove(entry.path)
+            total_size -= entry_size
+        except OSError:
+            # File is still open by another request (Windows) - try again next time
+            pass
+
 def download_audio(video_id):
-    """Download audio from YouTube using yt-dlp"""
-    temp_dir = tempfile.mkdtemp()
+    """Download audio from YouTube using yt-dlp, reusing the cached copy if present"""
+    cached_file = find_cached_audio(video_id)
+    if cached_file:
+        return cached_file
+    
+    # Download into a temp dir inside the cache so the final move is atomic
+    temp_dir = tempfile.mkdtemp(dir=CACHE_DIR)
     temp_file = os.path.join(temp_dir, f"{video_id}.%(ext)s")
     
     ydl_opts = {
-        'format': 'bestaudio/best',
+        # Prefer m4a, which FFmpeg decodes without any remux
+        'format': 'bestaudio[ext=m4a]/bestaudio/best',
         'outtmpl': temp_file,
         'noplaylist': True,
+        # Fetch fragments in parallel and in large chunks to saturate the link
+        'concurrent_fragment_downloads': 8,
+        'http_chunk_size': 10 * 1024 * 1024,
+        'retries': 3,
+        'fragment_retries': 3,
+        # Keep the local download time as mtime, the cache evicts by it
+        'updatetime': False,
         # Try to download without post-processing first
         'postprocessors': []
     }
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([f'https://www.youtube.com/watch?v={video_id}'])
-        
-        # Find the downloaded file
-        downloaded_file = None
-        for file in os.listdir(temp_dir):
-            if file.startswith(video_id):
-                downloaded_file = os.path.join(temp_dir, file)
-                break
+            info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=True)
+            # Ask yt-dlp for the exact path it wrote instead of scanning the temp dir
+            downloaded_file = ydl.prepare_filename(info)
         
-        if not downloaded_file:
+        if not os.path.exists(downloaded_file):
             raise Exception("Downloaded file not found")
-
-        # Load and normalize the audio
-        audio = AudioSegment.from_file(downloaded_file)
-        normalized_audio = normalize_audio(audio)
-        normalized_audio.export(downloaded_file, format="mp3")
-
-        return downloaded_file
+        
+        # Move it into the cache
+        cached_file = os.path.join(CACHE_DIR, os.path.basename(downloaded_file))
+        os.replace(downloaded_file, cached_file)
+        # Mark it as the most recently used entry before evicting
+        os.utime(cached_file)
+        evict_audio_cache()
+        
+        return cached_file
     
     except FileNotFoundError as e:
         if "ffmpeg" in str(e).lower() or "avconv" in str(e).lower():
@@ -112,138 +186,246 @@ def download_audio(video_id):
             raise Exception("FFmpeg is required but not found. Please install FFmpeg and add it to your system PATH.")
         else:
             raise Exception(f"Failed to download audio: {error_msg}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-def apply_reverb(audio_segment, decay_time):
-    """Apply enhanced reverb effect using multiple delays for more spacious sound"""
-    # Convert to numpy array
-    samples = audio_segment.get_array_of_samples()
-    if audio_segment.channels == 2:
-        samples = np.array(samples).reshape((-1, 2))
-    else:
-        samples = np.array(samples)
-    
-    # Create reverb using multiple delayed versions with different characteristics
-    sample_rate = audio_segment.frame_rate
+def load_audio(audio_file_path):
+    """Decode audio to float32 mono or stereo samples in a single FFmpeg pass"""
+    command = [
+        'ffmpeg', '-v', 'error', '-i', audio_file_path,
+        # Mono stays mono (no upmixed copy to process), anything wider is downmixed to stereo
+        '-vn', '-af', 'aformat=channel_layouts=mono|stereo', '-ar', str(SAMPLE_RATE),
+        '-acodec', 'pcm_f32le', '-f', 'wav', '-'
+    ]
     
-    reverb_audio = samples.astype(np.float32)
+    try:
+        result = subprocess.run(command, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()}")
+    
+    # Walk the WAV chunks for the channel count and the start of the sample data.
+    # The data chunk size is unreliable when FFmpeg writes to a pipe, so take everything after it
+    wav = memoryview(result.stdout)
+    channels = 2
+    position = 12
+    while position + 8 <= len(wav):
+        chunk_id = bytes(wav[position:position + 4])
+        chunk_size = int.from_bytes(wav[position + 4:position + 8], 'little')
+        if chunk_id == b'fmt ':
+            channels = int.from_bytes(wav[position + 10:position + 12], 'little')
+        elif chunk_id == b'data':
+            data = wav[position + 8:]
+            data = data[:len(data) - len(data) % (4 * channels)]
+            # Samples are in [-1.0, 1.0], shaped (frames, channels)
+            samples = np.frombuffer(data, dtype=np.float32).reshape((-1, channels))
+            # The data chunk offset depends on FFmpeg's metadata chunks, so copy
+            # misaligned samples once before they are cached and shared by every preset
+            if not samples.flags.aligned:
+                samples = samples.copy()
+                samples.flags.writeable = False
+            return samples
+        position += 8 + chunk_size + (chunk_size & 1)
+    
+    raise Exception("Failed to decode audio: FFmpeg returned no audio data")
+
+def export_mp3(samples, output_path):
+    """Encode float32 samples to MP3 by piping 16-bit PCM straight into FFmpeg"""
+    pcm = np.clip(samples * 32768, -32768, 32767).astype(np.int16)
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', str(samples.shape[1]), '-i', '-',
+        # Mono sources are only duplicated to stereo here, inside the encoder
+        '-ac', '2',
+        # ~130 kbps VBR with LAME's faster psychoacoustic model is plenty for ambience
+        '-codec:a', 'libmp3lame', '-q:a', '5', '-compression_level', '7',
+        output_path
+    ]
     
+    try:
+        # A flat byte view feeds stdin without another full-size copy
+        subprocess.run(command, input=memoryview(pcm).cast('B'), capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Failed to encode audio: {e.stderr.decode(errors='replace').strip()}")
+
+def apply_low_pass(samples, cutoff, order=4):
+    """Apply a zero-phase Butterworth low-pass filter"""
+    if len(samples) == 0:
+        return samples
+    
+    # Second-order sections keep the higher-order filter numerically stable
+    sos = signal.butter(order, cutoff, btype='low', output='sos', fs=SAMPLE_RATE)
+    # Shrink scipy's default edge padding for clips shorter than it
+    padlen = min(3 * (2 * len(sos) + 1), len(samples) - 1)
+    return signal.sosfiltfilt(sos, samples, axis=0, padlen=padlen).astype(np.float32)
+
+def apply_reverb(samples, decay_time):
+    """Apply enhanced reverb effect using multiple delays for more spacious sound"""
     # Multiple delay lines for more complex reverb
     delay_times = [0.03, 0.07, 0.13, 0.21, 0.34]  # Various delay times in seconds
+    num_echoes = max(3, int(decay_time * 8))  # More echoes for longer decay
     
-    for delay_time in delay_times:
-        delay_samples = int(delay_time * sample_rate)
-        
-        # Add multiple echoes with decreasing amplitude for each delay line
-        num_echoes = max(3, int(decay_time * 8))  # More echoes for longer decay
-        for i in range(1, num_echoes + 1):
-            delay = delay_samples * i
-            # Much more conservative amplitude to prevent clipping
-            amplitude = 0.2 * (0.5 ** i) * (1.0 / len(delay_times))
-            
-            if audio_segment.channels == 2:
-                delayed = np.zeros_like(reverb_audio)
-                if delay < len(samples):
-                    delayed[delay:] = samples[:-delay] * amplitude
-                reverb_audio += delayed
-            else:
-                delayed = np.zeros_like(reverb_audio)
-                if delay < len(samples):
-                    delayed[delay:] = samples[:-delay] * amplitude
-                reverb_audio += delayed
-    
-    # Convert back to AudioSegment
-    reverb_audio = np.clip(reverb_audio, -32768, 32767).astype(np.int16)
-    
-    if audio_segment.channels == 2:
-        reverb_audio = reverb_audio.flatten()
-    
-    return AudioSegment(
-        reverb_audio.tobytes(),
-        frame_rate=sample_rate,
-        sample_width=2,
-        channels=audio_segment.channels
-    )
-
-def apply_stereo_widening(audio_segment, width_factor):
-    """Apply stereo widening effect"""
-    if audio_segment.channels != 2:
-        return audio_segment
-    
-    # Convert to numpy array
-    samples = np.array(audio_segment.get_array_of_samples()).reshape((-1, 2))
-    left = samples[:, 0].astype(np.float32)
-    right = samples[:, 1].astype(np.float32)
+    if len(samples) == 0:
+        return samples
     
-    # Calculate mid and side signals
-    mid = (left + right) / 2
-    side = (left - right) / 2
+    # Collapse every echo tap into one sparse impulse response (dry signal at lag 0)
+    max_delay = min(int(max(delay_times) * SAMPLE_RATE) * num_echoes, len(samples) - 1)
+    impulse_response = np.zeros(max_delay + 1, dtype=np.float32)
+    impulse_response[0] = 1.0
     
-    # Widen by increasing side signal
-    side *= width_factor
+    # Tap table: multiple echoes with decreasing amplitude for each delay line
+    echo_numbers = np.arange(1, num_echoes + 1)
+    delay_samples = (np.array(delay_times) * SAMPLE_RATE).astype(np.int64)
+    delays = (delay_samples[:, np.newaxis] * echo_numbers).ravel()
+    # Much more conservative amplitude to prevent clipping
+    amplitudes = np.tile(0.2 * (0.5 ** echo_numbers) * (1.0 / len(delay_times)), len(delay_times))
     
-    # Convert back to left/right
-    new_left = mid + side
-    new_right = mid - side
+    in_range = delays <= max_delay
+    np.add.at(impulse_response, delays[in_range], amplitudes[in_range])
     
-    # Combine and normalize
-    new_samples = np.column_stack((new_left, new_right))
-    new_samples = np.clip(new_samples, -32768, 32767).astype(np.int16)
-    
-    return AudioSegment(
-        new_samples.flatten().tobytes(),
-        frame_rate=audio_segment.frame_rate,
-        sample_width=2,
-        channels=2
-    )
+    # Single FFT convolution instead of one full-length pass per echo
+    return signal.fftconvolve(samples, impulse_response[:, np.newaxis], mode='full', axes=0)[:len(samples)]
+
+def apply_stereo_widening(samples, width_factor):
+    """Apply stereo widening effect"""
+    if samples.shape[1] != 2:
+        return samples
+    
+    # Mid/side widening as a single 2x2 transform:
+    # mid = (L + R) / 2, side = width * (L - R) / 2, L' = mid + side, R' = mid - side
+    w = np.float32(width_factor)
+    ms_matrix = np.array([[1 + w, 1 - w],
+                          [1 - w, 1 + w]], dtype=np.float32) * 0.5
+    return samples @ ms_matrix.T
 
-def process_audio(audio_file_path, preset_name):
+def process_audio(samples, preset_name):
     """Apply ambience processing based on preset"""
     preset = PRESETS[preset_name]
     
-    # Load audio
-    audio = AudioSegment.from_file(audio_file_path)
-    
-    # Convert to stereo if mono
-    if audio.channels == 1:
-        audio = audio.set_channels(2)
-    
-    # Apply much more aggressive initial gain reduction to prevent clipping
-    audio = audio + preset['gain_reduction'] - 10  # Extra -10dB reduction
-    
-    # Apply distance simulation - reduce volume significantly to simulate being far away
-    distance_reduction = -25 * (1 - preset['distance_factor'])  # Even more reduction
-    audio = audio + distance_reduction
+    # Everything below works on the decoded float32 samples (never modified in place,
+    # they are shared between presets). There are no gain stages: every step is linear
+    # and unclipped, so the final peak normalization alone sets the output level
     
     # Apply low-pass filter (more aggressive for distance)
-    audio = low_pass_filter(audio, preset['low_pass_cutoff'])
-    
-    # Apply extra muffling for "Next Room" preset
-    if preset.get('extra_muffling'):
-        # Additional EQ dip around 2kHz for more muffled sound
-        muffled_audio = low_pass_filter(audio, 1000).apply_gain(-8)  # Even more aggressive muffling
-        audio = audio.overlay(muffled_audio, gain_during_overlay=-8)
-        # Apply additional high-frequency roll-off
-        audio = low_pass_filter(audio, 800)
+    samples = apply_low_pass(samples, preset['low_pass_cutoff'], preset['low_pass_order'])
     
     # Apply reverb (much more pronounced)
-    audio = apply_reverb(audio, preset['reverb_decay'])
+    samples = apply_reverb(samples, preset['reverb_decay'])
     
     # Apply stereo widening for spatial effect
-    audio = apply_stereo_widening(audio, preset['stereo_width'])
+    samples = apply_stereo_widening(samples, preset['stereo_width'])
     
-    # Apply additional gain reduction before normalization to prevent clipping
-    audio = audio - 5  # Extra safety margin
+    # Final peak normalization to just under full scale to prevent clipping
+    peak = max(samples.max(initial=0.0), -samples.min(initial=0.0))
+    if peak > 0:
+        samples *= np.float32(10 ** (-0.1 / 20) / peak)  # 0.1 dB headroom
     
-    # Final normalization to prevent clipping but keep it very quiet
-    audio = normalize(audio)
+    return samples
+
+def process_and_export(samples, preset_name, output_path):
+    """Process audio with a preset and export it as MP3 (runs in the DSP pool)"""
+    export_mp3(process_audio(samples, preset_name), output_path)
+    return output_path
+
+def get_processed_audio(video_id, preset_name):
+    """Return the cached output filename for a video/preset pair, if the file still exists"""
+    key = (video_id, preset_name)
+    with processed_cache_lock:
+        output_filename = processed_cache.get(key)
+        if output_filename is None:
+            return None
+        
+        if not os.path.exists(os.path.join('static', 'processed', output_filename)):
+            del processed_cache[key]
+            return None
+        
+        processed_cache.move_to_end(key)
+        return output_filename
+
+def cache_processed_audio(video_id, preset_name, output_filename):
+    """Remember a processed output, deleting the least recently used ones past PROCESSED_CACHE_SIZE"""
+    with processed_cache_lock:
+        evicted_filenames = []
+        
+        # Two requests that rendered the same pair at once leave the older file orphaned
+        displaced_filename = processed_cache.get((video_id, preset_name))
+        if displaced_filename and displaced_filename != output_filename:
+            evicted_filenames.append(displaced_filename)
+        
+        processed_cache[(video_id, preset_name)] = output_filename
+        processed_cache.move_to_end((video_id, preset_name))
+        
+        while len(processed_cache) > PROCESSED_CACHE_SIZE:
+            _, evicted_filename = processed_cache.popitem(last=False)
+            evicted_filenames.append(evicted_filename)
+        
+        for evicted_filename in evicted_filenames:
+            try:
+                os.remove(os.path.join('static', 'processed', evicted_filename))
+            except OSError:
+                pass
+
+def get_decoded_audio(video_id):
+    """Return decoded samples for a video, downloading and decoding only on a cache miss"""
+    with decoded_cache_lock:
+        samples = decoded_cache.get(video_id)
+        if samples is not None:
+            decoded_cache.move_to_end(video_id)
+            return samples
+    
+    # Download (served from the disk cache after the first request) and decode
+    audio_file = download_pool.submit(download_audio, video_id).result()
+    samples = load_audio(audio_file)
+    
+    # Keep it in memory unless it alone would blow the budget (e.g. hours-long videos)
+    if samples.nbytes <= DECODED_CACHE_MAX_BYTES:
+        with decoded_cache_lock:
+            decoded_cache[video_id] = samples
+            total_size = sum(cached.nbytes for cached in decoded_cache.values())
+            while total_size > DECODED_CACHE_MAX_BYTES:
+                _, evicted_samples = decoded_cache.popitem(last=False)
+                total_size -= evicted_samples.nbytes
+    
+    return samples
+
+def render_and_cache(video_id, preset_name):
+    """Process and export one preset from the decoded audio and cache the result (runs in the DSP pool)"""
+    try:
+        # Decoded audio is reused from memory for recently seen videos
+        samples = get_decoded_audio(video_id)
+        
+        output_filename = f"{uuid.uuid4().hex}.mp3"
+        output_path = os.path.join('static', 'processed', output_filename)
+        process_and_export(samples, preset_name, output_path)
+        
+        cache_processed_audio(video_id, preset_name, output_filename)
+        return output_filename
+    finally:
+        with rendering_lock:
+            del rendering[(video_id, preset_name)]
+
+def render_preset(video_id, preset_name):
+    """Return the processed MP3 filename for a video/preset pair, processing it if needed"""
+    key = (video_id, preset_name)
+    with rendering_lock:
+        output_filename = get_processed_audio(video_id, preset_name)
+        if output_filename:
+            return output_filename
+        
+        # Wait on a render another request already started instead of duplicating it
+        future = rendering.get(key)
+        if future is None:
+            future = dsp_pool.submit(render_and_cache, video_id, preset_name)
+            rendering[key] = future
     
-    return audio
+    return future.result()
 
-def normalize_audio(audio_segment):
-    """Normalize audio to a target dBFS level."""
-    target_dBFS = -40.0  # Very quiet target loudness level to prevent distortion
-    change_in_dBFS = target_dBFS - audio_segment.dBFS
-    return audio_segment.apply_gain(change_in_dBFS)
+def prerender_presets(video_id):
+    """Render every preset for a video one at a time (runs in the prerender pool)"""
+    for preset_name in PRESETS:
+        try:
+            render_preset(video_id, preset_name)
+        except Exception:
+            app.logger.exception(f"Failed to prerender {preset_name} for {video_id}")
 
 @app.route('/')
 def index():
@@ -259,6 +441,9 @@ def process_video():
     if not youtube_url:
         return jsonify({'error': 'YouTube URL is required'}), 400
     
+    if preset not in PRESETS:
+        return jsonify({'error': 'Unknown preset'}), 400
+    
     # Check if FFmpeg is available
     if not check_ffmpeg():
         return jsonify({
@@ -271,20 +456,10 @@ def process_video():
         return jsonify({'error': 'Invalid YouTube URL'}), 400
     
     try:
-        # Download audio
-        audio_file = download_audio(video_id)
-        
-        # Process audio with ambience
-        processed_audio = process_audio(audio_file, preset)
-        
-        # Save processed audio
-        output_filename = f"{uuid.uuid4().hex}.mp3"
-        output_path = os.path.join('static', 'processed', output_filename)
-        processed_audio.export(output_path, format='mp3')
-        
-        # Clean up temporary file
-        os.remove(audio_file)
-        os.rmdir(os.path.dirname(audio_file))
+        # Process audio with the requested preset, then the others in the background
+        # so switching presets later is usually instant
+        output_filename = render_preset(video_id, preset)
+        prerender_pool.submit(prerender_presets, video_id)
         
         # Return playback page
         return render_template('player.html', 
@@ -306,6 +481,9 @@ def reprocess_audio():
     if not video_id or not new_preset:
         return jsonify({'error': 'Video ID and preset are required'}), 400
     
+    if new_preset not in PRESETS:
+        return jsonify({'error': 'Unknown preset'}), 400
+    
     # Check if FFmpeg is available
     if not check_ffmpeg():
         return jsonify({
@@ -313,20 +491,8 @@ def reprocess_audio():
         }), 500
     
     try:
-        # Download audio again
-        audio_file = download_audio(video_id)
-        
-        # Process with new preset
-        processed_audio = process_audio(audio_file, new_preset)
-        
-        # Save new processed audio
-        output_filename = f"{uuid.uuid4().hex}.mp3"
-        output_path = os.path.join('static', 'processed', output_filename)
-        processed_audio.export(output_path, format='mp3')
-        
-        # Clean up temporary file
-        os.remove(audio_file)
-        os.rmdir(os.path.dirname(audio_file))
+        # Process with new preset (usually already rendered by /process)
+        output_filename = render_preset(video_id, new_preset)
         
         return jsonify({
             'audio_file': output_filename,
@@ -342,4 +508,4 @@ def serve_processed_audio(filename):
     return send_from_directory('static/processed', filename)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    app.run(debug=True, host='127.0.0.1', port=5000, threaded=True)